@@ -1,24 +1,71 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Dict, Union, Optional
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.responses import Response
+from typing import Any, Dict, List, Match, Union, Optional, Pattern, Tuple
 from pathlib import Path
-import tempfile
+from datetime import datetime
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import io
+import orjson
 import os
 import re
+import tempfile
+import aiofiles.tempfile
 from dateutil import parser as date_parser
 from pdfminer.high_level import extract_text
+import pypdfium2
+import ahocorasick
+from concurrent.futures.process import BrokenProcessPool
 from tenacity import retry, stop_after_attempt, wait_exponential
+from cachetools import LRUCache
+
+try:
+    import re2
+except Exception:  # pragma: no cover
+    re2 = None  # type: ignore
 
 try:
     from openai import OpenAI
 except Exception:  # pragma: no cover
     OpenAI = None  # type: ignore
 
+# Shared client so retries and later requests reuse its HTTP connection pool
+_OPENAI_CLIENT = OpenAI() if (OpenAI is not None and os.getenv("OPENAI_API_KEY")) else None
+
+
+class ORJSONResponse(Response):
+    """JSON response rendered with orjson, which is considerably faster than the stdlib encoder."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(title="PDF Upload API", version="0.1.0", default_response_class=ORJSONResponse)
+
 
-app = FastAPI(title="PDF Upload API", version="0.1.0")
+CHUNK_SIZE_BYTES = 4 * 1024 * 1024  # 4 MiB
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # 50 MiB
 
+# Uploads are saved under the user's Downloads/pdf_uploads, created once at startup
+_UPLOAD_DIR = Path.home() / "Downloads" / "pdf_uploads"
+_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-CHUNK_SIZE_BYTES = 1024 * 1024  # 1 MiB
+# PDF parsing is CPU-bound; run it in worker processes to keep the event loop free.
+# ProcessPoolExecutor rejects more than 61 workers on Windows.
+EXECUTOR_MAX_WORKERS = min(os.cpu_count() or 1, 61)
+EXECUTOR = concurrent.futures.ProcessPoolExecutor(max_workers=EXECUTOR_MAX_WORKERS)
+
+
+def _replace_broken_executor(broken: concurrent.futures.ProcessPoolExecutor) -> None:
+    """Swap in a fresh pool after a worker died; a broken pool never recovers on its own."""
+    global EXECUTOR
+    if EXECUTOR is broken:
+        EXECUTOR = concurrent.futures.ProcessPoolExecutor(max_workers=EXECUTOR_MAX_WORKERS)
+    broken.shutdown(wait=False, cancel_futures=True)
 
 
 def is_probably_pdf(file_start: bytes) -> bool:
@@ -26,11 +73,82 @@ def is_probably_pdf(file_start: bytes) -> bool:
     return file_start.startswith(b"%PDF-")
 
 
+# Smallest one-page PDF the backends accept, used to warm them up at startup
+_WARMUP_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 72 72]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+@app.on_event("startup")
+async def warm_up() -> None:
+    """Pay one-off initialisation costs before the first request does.
+
+    Spawns a parsing worker and touches the PDF backend in it, then runs the regex
+    extraction and date parsing once. Failures are ignored; this is only an optimisation.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(EXECUTOR, _extract_text_fast, _WARMUP_PDF)
+        _extract_lease_facts_from_text("Tenant: x\nLandlord: y\n")
+        _normalize_date("01/01/2024")
+    except Exception:
+        pass
+
+
+@app.on_event("shutdown")
+def shutdown_executor() -> None:
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject bodies whose declared size exceeds MAX_UPLOAD_BYTES before they are read."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        return ORJSONResponse({"detail": "Uploaded file exceeds the maximum allowed size"}, status_code=413)
+    return await call_next(request)
+
+
 @app.get("/health")
 async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+def _spooled_fileno(file: UploadFile) -> Optional[int]:
+    """Return the upload's file descriptor when its body already lives on disk.
+
+    Returns None when os.sendfile is unavailable (e.g. Windows), the size is unknown, or
+    the SpooledTemporaryFile is still in memory (asking for its fileno would force a rollover).
+    """
+    if not hasattr(os, "sendfile") or file.size is None:
+        return None
+    # SpooledTemporaryFile has no public "rolled over" flag; _rolled is a CPython
+    # implementation detail. If it is ever missing, treat the body as in memory.
+    if isinstance(file.file, tempfile.SpooledTemporaryFile) and not getattr(file.file, "_rolled", False):
+        return None
+    try:
+        return file.file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def _sendfile_all(out_fd: int, in_fd: int, count: int) -> None:
+    """Copy ``count`` bytes from the start of ``in_fd`` to ``out_fd`` without going through userspace.
+
+    Raises OSError if the platform's sendfile cannot copy between regular files
+    (e.g. macOS, which requires a socket as ``out_fd``) or the source ends early.
+    """
+    offset = 0
+    while offset < count:
+        sent = os.sendfile(out_fd, in_fd, offset, count - offset)
+        if sent == 0:
+            raise OSError(f"sendfile stopped after {offset} of {count} bytes")
+        offset += sent
+
+
 @app.post("/upload-pdf")
 async def upload_pdf(file: UploadFile = File(...)) -> Dict[str, Union[str, int]]:
     """Accept a PDF via multipart/form-data and save it to a temporary folder.
@@ -46,36 +164,54 @@ async def upload_pdf(file: UploadFile = File(...)) -> Dict[str, Union[str, int]]
     if not original_filename.lower().endswith(".pdf") and content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF with content-type application/pdf")
 
-    # Peek and validate that the file starts like a PDF
-    first_bytes = await file.read(5)
-    await file.seek(0)
-
-    if not is_probably_pdf(first_bytes):
-        # You may choose to reject here instead of being lenient
-        # For stricter validation uncomment the next line
-        # raise HTTPException(status_code=400, detail="Uploaded file does not appear to be a valid PDF")
-        pass
-
-    # Prepare output directory under user's Downloads/pdf_uploads
-    user_home = Path.home()
-    downloads_dir = user_home / "Downloads"
-    output_dir = downloads_dir / "pdf_uploads"
-    output_dir.mkdir(parents=True, exist_ok=True)
+    # Validate the first chunk looks like a PDF before we write it out. Starlette has
+    # already parsed (and possibly spooled) the body; only the size middleware avoids that.
+    chunk = await file.read(CHUNK_SIZE_BYTES)
+    if not is_probably_pdf(chunk[:5]):
+        raise HTTPException(status_code=400, detail="Uploaded file does not appear to be a valid PDF")
 
     suffix = ".pdf" if not original_filename.lower().endswith(".pdf") else ""
 
     # Stream to disk without loading entire file into memory
     total_bytes = 0
-    with tempfile.NamedTemporaryFile(delete=False, dir=output_dir, suffix=suffix) as tmp:
-        saved_path = Path(tmp.name)
-        while True:
-            chunk = await file.read(CHUNK_SIZE_BYTES)
-            if not chunk:
-                break
-            tmp.write(chunk)
-            total_bytes += len(chunk)
-
-    return JSONResponse(
+    saved_path: Optional[Path] = None
+    try:
+        async with aiofiles.tempfile.NamedTemporaryFile("wb", delete=False, dir=_UPLOAD_DIR, suffix=suffix) as tmp:
+            saved_path = Path(tmp.name)
+            copied = False
+            src_fd = _spooled_fileno(file)
+            if src_fd is not None and file.size <= MAX_UPLOAD_BYTES:
+                # Body is already spooled to disk; copy it in kernel space
+                try:
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, _sendfile_all, tmp.fileno(), src_fd, file.size)
+                    total_bytes = file.size
+                    copied = True
+                except OSError:
+                    # Discard whatever was copied and redo it with the chunked path
+                    await tmp.seek(0)
+                    await tmp.truncate()
+                    await file.seek(0)
+                    chunk = await file.read(CHUNK_SIZE_BYTES)
+            if not copied:
+                while chunk:
+                    total_bytes += len(chunk)
+                    if total_bytes > MAX_UPLOAD_BYTES:
+                        break
+                    await tmp.write(chunk)
+                    chunk = await file.read(CHUNK_SIZE_BYTES)
+    except BaseException:
+        # Never leave a partial upload behind
+        if saved_path is not None:
+            saved_path.unlink(missing_ok=True)
+        raise
+
+    if total_bytes > MAX_UPLOAD_BYTES:
+        # Body without (or with a wrong) Content-Length; drop the partial file
+        saved_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail="Uploaded file exceeds the maximum allowed size")
+
+    return ORJSONResponse(
         {
             "message": "PDF uploaded successfully",
             "original_filename": original_filename,
@@ -86,93 +222,282 @@ async def upload_pdf(file: UploadFile = File(...)) -> Dict[str, Union[str, int]]
     )
 
 
+def _extract_text_fast(data: Union[bytes, bytearray]) -> str:
+    """Extract text from in-memory PDF bytes with pypdfium2, falling back to pdfminer."""
+    try:
+        # pypdfium2 rejects bytearray but reads any binary stream
+        pdf = pypdfium2.PdfDocument(io.BytesIO(data))
+        try:
+            return "\n".join(page.get_textpage().get_text_range() for page in pdf)
+        finally:
+            pdf.close()
+    except Exception:
+        return extract_text(io.BytesIO(data)) or ""
+
+
+# dateutil parser built once with month-first parserinfo for the fuzzy fallback
+_DATE_INFO = date_parser.parserinfo(dayfirst=False)
+_DATE_PARSER = date_parser.parser(_DATE_INFO)
+
+# Formats commonly used in leases, tried before falling back to dateutil. Month-first
+# formats come before day-first ones to match dateutil's dayfirst=False behaviour.
+_DATE_FORMATS = ("%B %d, %Y", "%b %d, %Y", "%m/%d/%Y", "%m-%d-%Y", "%Y-%m-%d", "%d %B %Y", "%d/%m/%Y")
+
+
+@functools.lru_cache(maxsize=512)
 def _normalize_date(value: str) -> Optional[str]:
     """Parse arbitrary date strings and format as DD-MM-YYYY.
 
     Returns None if parsing fails.
     """
+    stripped = value.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(stripped, fmt).strftime("%d-%m-%Y")
+        except ValueError:
+            continue
     try:
-        dt = date_parser.parse(value, dayfirst=False, fuzzy=True)
+        dt = _DATE_PARSER.parse(value, fuzzy=True)
         return dt.strftime("%d-%m-%Y")
     except Exception:
         return None
 
 
-def _first_match(pattern: str, text: str, flags: int = re.IGNORECASE) -> Optional[str]:
-    m = re.search(pattern, text, flags)
-    return m.group(1).strip() if m else None
+def _compile(pattern: str) -> Pattern[str]:
+    """Compile a pattern, using RE2 (linear time) when installed.
+
+    Patterns are written in lowercase and matched case-sensitively against the
+    normalised document (see _normalize_for_matching), so no engine has to case-fold
+    per character.
+
+    RE2's \\s, \\d, \\w and \\b are ASCII-only, while stdlib re is Unicode-aware. Unicode
+    whitespace (e.g. the non-breaking spaces common in extracted PDF text) is mapped to
+    ASCII spaces before matching, so \\s behaves the same under both engines. Non-ASCII
+    digits and letters can still differ between engines, e.g. in a suite designator or
+    a letter right before a label.
+    """
+    if re2 is not None:
+        return re2.compile(pattern)
+    return re.compile(pattern)
+
+
+# Whitespace that stdlib re's \s matches but RE2's does not ("\u3000" is the highest
+# code point str.isspace() accepts)
+_UNICODE_SPACES = "".join(c for c in map(chr, range(0x3001)) if c.isspace() and c not in " \t\n\r\f")
+_RE_UNICODE_SPACE = _compile("[" + _UNICODE_SPACES + "]")
+
+
+def _normalize_for_matching(text: str) -> str:
+    """Lowercase ``text`` and map Unicode whitespace to " ", keeping every offset valid in the original."""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters (e.g. "İ") expand when lowercased; leave those as they are
+        lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+    return _RE_UNICODE_SPACE.sub(" ", lowered)
+
+
+_RE_TENANT = _compile(r"\btenant\s*:\s*(.+)")
+_RE_LANDLORD = _compile(r"\blandlord\s*:\s*(.+)")
+_RE_ADDRESS_LABEL = _compile(r"\b(?:premises(?:\s*address)?|property(?:\s*address)?|address)\s*(?:\:|\-)\s*(.+)")
+_RE_SUITE = _compile(r"(?:suite|ste\.?|#)\s*([\w\-]+)")
+# Applied to short address lines in their original casing
+_RE_SUITE_STRIP = re.compile(r"(?:,?\s*)(?:Suite|Ste\.?|#)\s*[\w\-]+", re.IGNORECASE)
+# Multiline, and whitespace may not cross line breaks, so a match is exactly one street line
+_RE_STREET = _compile(r"(?m)^[^\S\n]*\d{1,6}[^\S\n]+.+?(?:street|st\.|avenue|ave\.|road|rd\.|boulevard|blvd\.|lane|ln\.|drive|dr\.|court|ct\.|way|terrace|ter\.)\b.*")
+_RE_SQFT = _compile(r"\b(?:rentable|leasable|approx\.?|total)?\s*(?:square\s*feet|sq\.?\s*ft\.?|sf)[^\d]*(\d[\d,\.]+)")
+_RE_NON_NUMERIC = re.compile(r"[^\d\.]")
+_RE_COMMENCE = _compile(r"\b(?:lease\s*)?commencement\s*date\s*:?\s*([^\n\r]+)")
+_RE_EXPIRE = _compile(r"\b(?:lease\s*)?(?:expiration|expiry)\s*date\s*:?\s*([^\n\r]+)")
+_RE_PROP_SHARE = _compile(r"\bproportionate\s+share\s*:?\s*(\d{1,2}(?:\.\d+)?\s*%)")
+_RE_BASE_YEAR = _compile(r"\bbase\s+year\s*:?\s*(\d{4})\b")
+_RE_SEC_DEPOSIT = _compile(r"\bsecurity\s+deposit\s*:?\s*(?:\$\s*)?([\d,]+(?:\.\d{2})?)\b")
+_RE_SEC_DEPOSIT_NONE = _compile(r"\bsecurity\s+deposit\b[^\n\r]*(?:none|n/a|no\s+deposit)")
+
+# Lowercase keyword -> field for the label-anchored facts. One pass over the text
+# finds every keyword; each field's pattern is then only tried on a short window
+# starting at one of its keyword hits instead of scanning the whole document.
+_LABEL_KEYWORDS = {
+    "tenant": "tenant",
+    "landlord": "landlord",
+    "premises": "address",
+    "property": "address",
+    "address": "address",
+    "square": "square_feet",
+    "sq": "square_feet",
+    "sf": "square_feet",
+    "commencement": "commencement",
+    "expiration": "expiration",
+    "expiry": "expiration",
+    "proportionate": "proportionate_share",
+    "base": "base_year",
+    "security": "security_deposit",
+}
+LABEL_WINDOW_CHARS = 200
+# How far past LABEL_WINDOW_CHARS a window may run looking for the end of its line;
+# keeps windows bounded on text without line breaks
+LABEL_LINE_TAIL_MAX_CHARS = 2000
+
+
+def _build_label_automaton() -> "ahocorasick.Automaton":
+    automaton = ahocorasick.Automaton()
+    for keyword, field in _LABEL_KEYWORDS.items():
+        automaton.add_word(keyword, (len(keyword), field))
+    automaton.make_automaton()
+    return automaton
+
 
+_LABEL_AUTOMATON = _build_label_automaton()
 
-def _extract_address_and_suite(text: str) -> (Optional[str], Optional[str]):
-    lines = [l.strip() for l in text.splitlines()]
+
+def _find_label_offsets(text_lc: str) -> Dict[str, List[int]]:
+    """Return the start offsets of all label keywords in the lowercased text, grouped by field."""
+    offsets: Dict[str, List[int]] = {field: [] for field in _LABEL_KEYWORDS.values()}
+    for end, (length, field) in _LABEL_AUTOMATON.iter(text_lc):
+        start = end - length + 1
+        field_offsets = offsets[field]
+        # "sq" and "square" both hit at the same offset
+        if not field_offsets or field_offsets[-1] != start:
+            field_offsets.append(start)
+    return offsets
+
+
+# Lease addresses appear on the first page or two (cover page / basic lease
+# information), so the address heuristics only look at the head of the document.
+# This bounds regex work on long leases and avoids matching addresses quoted in
+# later sections such as notices or exhibits.
+ADDRESS_SCAN_MAX_LINES = 200
+ADDRESS_SCAN_MAX_CHARS = 8000
+
+
+def _search_near(pattern: Pattern[str], text: str, offsets: List[int]) -> Tuple[Optional[Match[str]], int]:
+    """Match the pattern at each label keyword offset in turn.
+
+    A match must start at the keyword its window was opened for; a later label that
+    happens to fall inside the window is matched from its own offset instead. Windows
+    cover at least LABEL_WINDOW_CHARS and then run to the end of that line (at most
+    LABEL_LINE_TAIL_MAX_CHARS further), so values are not cut off mid-line. Returns the
+    first hit and the offset of its window within ``text``.
+    """
+    for offset in offsets:
+        # Include the preceding character so \b in the pattern still sees the real word boundary
+        window_start = max(offset - 1, 0)
+        tail_limit = offset + LABEL_WINDOW_CHARS + LABEL_LINE_TAIL_MAX_CHARS
+        window_end = text.find("\n", offset + LABEL_WINDOW_CHARS, tail_limit)
+        if window_end == -1:
+            window_end = tail_limit
+        m = pattern.match(text[window_start:window_end], offset - window_start)
+        if m:
+            return m, window_start
+    return None, 0
+
+
+def _first_match_near(pattern: Pattern[str], text: str, text_lc: str, offsets: List[int]) -> Optional[str]:
+    """Match against the lowercased text and return group 1 in its original casing."""
+    m, base = _search_near(pattern, text_lc, offsets)
+    return text[base + m.start(1):base + m.end(1)].strip() if m else None
+
+
+def _find_street_line(text: str) -> Optional[Tuple[int, int]]:
+    """Return the (start, end) offsets of the first street-address line within the scanned head."""
+    head_end = 0
+    for _ in range(ADDRESS_SCAN_MAX_LINES):
+        head_end = text.find("\n", head_end) + 1
+        if not head_end:
+            head_end = len(text)
+            break
+    m = _RE_STREET.search(text[:head_end])
+    return m.span() if m else None
+
+
+def _find_suite(text: str, anchor: Optional[int]) -> Optional[Match[str]]:
+    """Return the suite designator closest to ``anchor``, or the first one without an anchor."""
+    best = None
+    for hit in _RE_SUITE.finditer(text):
+        if anchor is None:
+            return hit
+        if best is None or abs(hit.start() - anchor) < abs(best.start() - anchor):
+            best = hit
+        if hit.start() >= anchor:
+            # Later hits are only further away
+            break
+    return best
+
+
+def _extract_address_and_suite(
+    text: str, text_lc: Optional[str] = None, label_offsets: Optional[Dict[str, List[int]]] = None
+) -> (Optional[str], Optional[str]):
+    if text_lc is None:
+        text_lc = _normalize_for_matching(text)
+    if label_offsets is None:
+        label_offsets = _find_label_offsets(text_lc)
     address: Optional[str] = None
     suite: Optional[str] = None
+    # Offset the address starts at, and where the label's value line ends (if any)
+    anchor: Optional[int] = None
+    label_end = -1
 
     # 1) Label-based capture
-    m = re.search(r"\b(?:Premises(?:\s*Address)?|Property(?:\s*Address)?|Address)\s*(?:\:|\-)\s*(.+)", text, re.IGNORECASE)
-    if m:
-        line = m.group(1).strip()
-        s = re.search(r"(?:Suite|Ste\.?|#)\s*([\w\-]+)", line, re.IGNORECASE)
-        if s:
-            suite = s.group(1).strip()
-            address = re.sub(r"(?:,?\s*)(?:Suite|Ste\.?|#)\s*[\w\-]+", "", line, flags=re.IGNORECASE).strip(" ,;-")
-        else:
-            address = line
+    address_offsets = [o for o in label_offsets["address"] if o < ADDRESS_SCAN_MAX_CHARS]
+    m, window_start = _search_near(_RE_ADDRESS_LABEL, text_lc, address_offsets)
+    if m and m.group(1).strip():
+        anchor = window_start + m.start(1)
+        label_end = window_start + m.end(1)
+        address = text[anchor:label_end].strip()
 
     # 2) Street-pattern lines if still missing
     if not address:
-        street_pat = r"^\s*\d{1,6}\s+.+?(?:Street|St\.|Avenue|Ave\.|Road|Rd\.|Boulevard|Blvd\.|Lane|Ln\.|Drive|Dr\.|Court|Ct\.|Way|Terrace|Ter\.)\b.*"
-        for idx, l in enumerate(lines):
-            if re.search(street_pat, l, re.IGNORECASE):
-                address = l.strip(" ,;-")
-                cand_lines = [l]
-                if idx + 1 < len(lines):
-                    cand_lines.append(lines[idx + 1])
-                for cl in cand_lines:
-                    s = re.search(r"(?:Suite|Ste\.?|#)\s*([\w\-]+)", cl, re.IGNORECASE)
-                    if s:
-                        suite = s.group(1).strip()
-                        break
-                break
-
-    # 3) Global suite search as last resort
-    if not suite:
-        s = re.search(r"(?:Suite|Ste\.?|#)\s*([\w\-]+)", text, re.IGNORECASE)
-        if s:
-            suite = s.group(1).strip()
+        span = _find_street_line(text_lc)
+        if span:
+            address = text[span[0]:span[1]].strip().strip(" ,;-")
+            anchor = span[0]
+
+    # 3) One suite scan: the designator closest to the address
+    s = _find_suite(text_lc, anchor)
+    if s:
+        suite = text[s.start(1):s.end(1)].strip()
+        if s.start() < label_end:
+            # Suite is part of the labelled address line; keep only the street address
+            address = _RE_SUITE_STRIP.sub("", address).strip(" ,;-")
 
     return address, suite
 
 
-def _extract_lease_facts_from_text(text: str) -> Dict[str, Optional[str]]:
+def _extract_lease_facts_from_text(
+    text: str, text_lc: Optional[str] = None, label_offsets: Optional[Dict[str, List[int]]] = None
+) -> Dict[str, Optional[str]]:
+    if text_lc is None:
+        text_lc = _normalize_for_matching(text)
+    if label_offsets is None:
+        label_offsets = _find_label_offsets(text_lc)
+
     # Parties
-    tenant = _first_match(r"\bTenant\s*:\s*(.+)", text)
-    landlord = _first_match(r"\bLandlord\s*:\s*(.+)", text)
+    tenant = _first_match_near(_RE_TENANT, text, text_lc, label_offsets["tenant"])
+    landlord = _first_match_near(_RE_LANDLORD, text, text_lc, label_offsets["landlord"])
 
     # Address and suite heuristics
-    address, suite = _extract_address_and_suite(text)
+    address, suite = _extract_address_and_suite(text, text_lc, label_offsets)
 
     # Square footage
-    square_feet_raw = _first_match(r"\b(?:Rentable|Leasable|Approx\.?|Total)?\s*(?:Square\s*Feet|Sq\.?\s*Ft\.?|SF)[^\d]*(\d[\d,\.]+)", text)
-    square_feet = re.sub(r"[^\d\.]", "", square_feet_raw) if square_feet_raw else None
+    square_feet_raw = _first_match_near(_RE_SQFT, text, text_lc, label_offsets["square_feet"])
+    square_feet = _RE_NON_NUMERIC.sub("", square_feet_raw) if square_feet_raw else None
 
     # Dates
-    commence_raw = _first_match(r"\b(?:Lease\s*)?Commencement\s*Date\s*:?\s*([^\n\r]+)", text)
-    expire_raw = _first_match(r"\b(?:Lease\s*)?(?:Expiration|Expiry)\s*Date\s*:?\s*([^\n\r]+)", text)
+    commence_raw = _first_match_near(_RE_COMMENCE, text, text_lc, label_offsets["commencement"])
+    expire_raw = _first_match_near(_RE_EXPIRE, text, text_lc, label_offsets["expiration"])
     lease_commencement = _normalize_date(commence_raw) if commence_raw else None
     lease_expiration = _normalize_date(expire_raw) if expire_raw else None
 
     # Proportionate Share
-    proportionate_share = _first_match(r"\bProportionate\s+Share\s*:?\s*(\d{1,2}(?:\.\d+)?\s*%)", text)
+    proportionate_share = _first_match_near(_RE_PROP_SHARE, text, text_lc, label_offsets["proportionate_share"])
 
     # Base Year
-    base_year = _first_match(r"\bBase\s+Year\s*:?\s*(\d{4})\b", text)
+    base_year = _first_match_near(_RE_BASE_YEAR, text, text_lc, label_offsets["base_year"])
 
     # Security Deposit
-    security_deposit = _first_match(r"\bSecurity\s+Deposit\s*:?\s*(?:\$\s*)?([\d,]+(?:\.\d{2})?)\b", text)
+    security_deposit = _first_match_near(_RE_SEC_DEPOSIT, text, text_lc, label_offsets["security_deposit"])
     if not security_deposit:
         # Detect explicit none
-        none_flag = re.search(r"\bSecurity\s+Deposit\b[^\n\r]*(?:None|N/A|No\s+Deposit)", text, re.IGNORECASE)
+        none_flag, _ = _search_near(_RE_SEC_DEPOSIT_NONE, text_lc, label_offsets["security_deposit"])
         security_deposit = "None" if none_flag else None
 
     combined_addr = None
@@ -219,6 +544,58 @@ def _format_facts_output(facts: Dict[str, Optional[str]]) -> Dict[str, Optional[
     return out
 
 
+# Label keyword field (see _LABEL_KEYWORDS) that locates each fact in the document
+_FACT_LABEL_FIELDS = {
+    "tenant_name": "tenant",
+    "landlord_name": "landlord",
+    "property_address": "address",
+    "suite": "address",
+    "property_address_and_suite": "address",
+    "total_square_feet": "square_feet",
+    "lease_commencement_date": "commencement",
+    "lease_expiration_date": "expiration",
+    "proportionate_share": "proportionate_share",
+    "base_year": "base_year",
+    "security_deposit": "security_deposit",
+}
+LLM_CONTEXT_MAX_CHARS = 6000
+LLM_CONTEXT_HITS_PER_FIELD = 3
+LLM_CONTEXT_BEFORE_CHARS = 200
+LLM_CONTEXT_AFTER_CHARS = 400
+
+
+# Only pay for an LLM call when regex extraction missed several facts or a key one
+LLM_MIN_MISSING_FACTS = 2
+LLM_REQUIRED_FACTS = ("tenant_name", "lease_commencement_date")
+
+
+def _needs_llm(missing: List[str]) -> bool:
+    return len(missing) >= LLM_MIN_MISSING_FACTS or any(key in missing for key in LLM_REQUIRED_FACTS)
+
+
+def _build_llm_context(text: str, missing: List[str], label_offsets: Dict[str, List[int]]) -> str:
+    """Collect the text around label hits for the missing facts, capped at LLM_CONTEXT_MAX_CHARS.
+
+    ``label_offsets`` are the ones found during regex extraction (see _find_label_offsets).
+    Falls back to the head of the document when none of the missing facts' labels occur.
+    """
+    fields = {_FACT_LABEL_FIELDS[key] for key in missing}
+    offsets = sorted({o for field in fields for o in label_offsets[field][:LLM_CONTEXT_HITS_PER_FIELD]})
+    if not offsets:
+        return text[:LLM_CONTEXT_MAX_CHARS]
+
+    # Merge overlapping windows so the same text is not sent twice
+    windows: List[List[int]] = []
+    for offset in offsets:
+        start, end = max(0, offset - LLM_CONTEXT_BEFORE_CHARS), offset + LLM_CONTEXT_AFTER_CHARS
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = end
+        else:
+            windows.append([start, end])
+    context = "\n---\n".join(text[start:end] for start, end in windows)
+    return context[:LLM_CONTEXT_MAX_CHARS]
+
+
 def _build_llm_prompt(document_text: str) -> str:
     return (
         "You are an expert lease analyst. Extract the following key facts from the lease text.\n"
@@ -236,12 +613,23 @@ def _build_llm_prompt(document_text: str) -> str:
     )
 
 
+# LLM results keyed by (model, prompt digest) so re-uploads of the same lease skip the API call
+_LLM_CACHE: LRUCache = LRUCache(maxsize=256)
+
+
+def _prompt_digest(prompt: str) -> str:
+    return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=6))
 def _call_openai_json(prompt: str, model: str = "gpt-4o-mini") -> Dict[str, Optional[str]]:
-    if OpenAI is None:
+    cache_key = (model, _prompt_digest(prompt))
+    cached = _LLM_CACHE.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+    if _OPENAI_CLIENT is None:
         raise RuntimeError("OpenAI SDK not available. Install requirements and set OPENAI_API_KEY.")
-    client = OpenAI()
-    response = client.chat.completions.create(
+    response = _OPENAI_CLIENT.chat.completions.create(
         model=model,
         messages=[{"role": "system", "content": "Extract structured facts as valid JSON only."}, {"role": "user", "content": prompt}],
         response_format={"type": "json_object"},
@@ -249,23 +637,17 @@ def _call_openai_json(prompt: str, model: str = "gpt-4o-mini") -> Dict[str, Opti
         max_tokens=400,
     )
     content = response.choices[0].message.content or "{}"
-    import json as _json
 
     try:
-        raw = _json.loads(content)
-        return _format_facts_output(raw)
+        raw = orjson.loads(content)
+        facts = _format_facts_output(raw)
+        _LLM_CACHE[cache_key] = facts
+        return dict(facts)
     except Exception as exc:
         # If LLM returns invalid JSON, fallback to empty structure
         return dict(LEASE_FACTS_SCHEMA)
 
 
-def _merge_facts(primary: Dict[str, Optional[str]], secondary: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
-    merged = dict(LEASE_FACTS_SCHEMA)
-    for key in merged.keys():
-        merged[key] = primary.get(key) or secondary.get(key)
-    return merged
-
-
 @app.post("/extract-lease-facts")
 async def extract_lease_facts(file: UploadFile = File(...)) -> Dict[str, Optional[str]]:
     """Accept a lease PDF and extract key facts from the document text.
@@ -280,38 +662,46 @@ async def extract_lease_facts(file: UploadFile = File(...)) -> Dict[str, Optiona
     if not original_filename.lower().endswith(".pdf") and content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF with content-type application/pdf")
 
-    # Persist upload to a temp file so pdfminer can read it efficiently
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        temp_path = Path(tmp.name)
-        while True:
-            chunk = await file.read(CHUNK_SIZE_BYTES)
-            if not chunk:
-                break
-            tmp.write(chunk)
+    # Validate the first chunk looks like a PDF before we buffer it
+    chunk = await file.read(CHUNK_SIZE_BYTES)
+    if not is_probably_pdf(chunk[:5]):
+        raise HTTPException(status_code=400, detail="Uploaded file does not appear to be a valid PDF")
+
+    # Buffer the upload in memory; the PDF backend reads bytes directly
+    data = bytearray()
+    while chunk:
+        data.extend(chunk)
+        if len(data) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Uploaded file exceeds the maximum allowed size")
+        chunk = await file.read(CHUNK_SIZE_BYTES)
 
+    executor = EXECUTOR
     try:
-        text = extract_text(str(temp_path)) or ""
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(executor, _extract_text_fast, data)
+    except BrokenProcessPool:
+        # A worker crashed (e.g. pdfium on a malformed PDF, or an OOM kill); fail only this request
+        _replace_broken_executor(executor)
+        raise HTTPException(status_code=500, detail="Failed to read PDF: PDF worker process crashed")
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to read PDF: {exc}")
-    finally:
-        try:
-            os.unlink(temp_path)
-        except Exception:
-            pass
 
     # Deterministic baseline
-    regex_facts = _extract_lease_facts_from_text(text)
+    text_lc = _normalize_for_matching(text)
+    label_offsets = _find_label_offsets(text_lc)
+    regex_facts = _extract_lease_facts_from_text(text, text_lc, label_offsets)
 
-    # Optional LLM enhancement if API key present
-    llm_facts: Dict[str, Optional[str]] = {}
-    if os.getenv("OPENAI_API_KEY"):
-        prompt = _build_llm_prompt(text)
-        try:
-            llm_facts = _call_openai_json(prompt)
-        except Exception:
-            llm_facts = {}
+    # Optional LLM enhancement if API key present and regex left meaningful gaps
+    missing = [k for k, v in regex_facts.items() if v is None]
+    if _OPENAI_CLIENT is None or not _needs_llm(missing):
+        return _format_facts_output(regex_facts)
+
+    prompt = _build_llm_prompt(_build_llm_context(text, missing, label_offsets))
+    try:
+        llm_facts = _call_openai_json(prompt)
+    except Exception:
+        llm_facts = {}
 
-    # Merge, preferring regex facts, filling gaps with LLM
-    merged = _merge_facts(regex_facts, llm_facts)
-    return _format_facts_output(merged)
+    # Merge, preferring regex facts, filling gaps with LLM; empty values become None
+    return {k: (regex_facts.get(k) or llm_facts.get(k)) or None for k in LEASE_FACTS_SCHEMA}
 
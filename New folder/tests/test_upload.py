@@ -1,6 +1,8 @@
 from fastapi.testclient import TestClient
-from app.main import app
+from app.main import app, _extract_lease_facts_from_text
+from pathlib import Path
 import io
+import pytest
 
 
 client = TestClient(app)
@@ -17,7 +19,8 @@ def test_health_ok():
     assert response.json()["status"] == "ok"
 
 
-def test_upload_pdf_success():
+def test_upload_pdf_success(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.main._UPLOAD_DIR", tmp_path)
     pdf_content = make_pdf_bytes()
     files = {"file": ("test.pdf", io.BytesIO(pdf_content), "application/pdf")}
     response = client.post("/upload-pdf", files=files)
@@ -27,7 +30,40 @@ def test_upload_pdf_success():
     assert data["original_filename"] == "test.pdf"
     assert data["content_type"] in ("application/pdf", None)
     assert data["size_bytes"] == len(pdf_content)
-    assert data["saved_path"]
+    assert Path(data["saved_path"]).parent == tmp_path
+
+
+def test_upload_pdf_large_file_saved_intact(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.main._UPLOAD_DIR", tmp_path)
+    # Larger than Starlette's in-memory spool, so the body is already on disk
+    pdf_content = make_pdf_bytes() + b"0" * (3 * 1024 * 1024)
+    files = {"file": ("large.pdf", io.BytesIO(pdf_content), "application/pdf")}
+    response = client.post("/upload-pdf", files=files)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["size_bytes"] == len(pdf_content)
+    with open(data["saved_path"], "rb") as saved:
+        assert saved.read() == pdf_content
+
+
+def test_upload_pdf_falls_back_when_sendfile_fails(monkeypatch, tmp_path):
+    import errno
+
+    monkeypatch.setattr("app.main._UPLOAD_DIR", tmp_path)
+
+    def failing_sendfile(*args):
+        # What macOS does for a regular-file out_fd
+        raise OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+
+    monkeypatch.setattr("app.main.os.sendfile", failing_sendfile, raising=False)
+    pdf_content = make_pdf_bytes() + b"0" * (3 * 1024 * 1024)
+    files = {"file": ("large.pdf", io.BytesIO(pdf_content), "application/pdf")}
+    response = client.post("/upload-pdf", files=files)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["size_bytes"] == len(pdf_content)
+    with open(data["saved_path"], "rb") as saved:
+        assert saved.read() == pdf_content
 
 
 def test_upload_rejects_non_pdf():
@@ -37,3 +73,241 @@ def test_upload_rejects_non_pdf():
     assert "File must be a PDF" in response.text
 
 
+def test_upload_rejects_bad_magic_bytes():
+    files = {"file": ("fake.pdf", io.BytesIO(b"not a pdf at all"), "application/pdf")}
+    response = client.post("/upload-pdf", files=files)
+    assert response.status_code == 400
+    assert "does not appear to be a valid PDF" in response.text
+
+
+def test_upload_rejects_oversize_content_length(monkeypatch):
+    monkeypatch.setattr("app.main.MAX_UPLOAD_BYTES", 16)
+    files = {"file": ("test.pdf", io.BytesIO(make_pdf_bytes()), "application/pdf")}
+    response = client.post("/upload-pdf", files=files)
+    assert response.status_code == 413
+
+
+SAMPLE_LEASE_PDF = Path(__file__).resolve().parent.parent / "Bayer 2015-10-05 Lease (1).pdf"
+
+
+def test_extract_lease_facts_from_sample_pdf(monkeypatch):
+    monkeypatch.setattr("app.main._OPENAI_CLIENT", None)
+    with SAMPLE_LEASE_PDF.open("rb") as pdf:
+        files = {"file": (SAMPLE_LEASE_PDF.name, pdf, "application/pdf")}
+        response = client.post("/extract-lease-facts", files=files)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["tenant_name"] == "Bayer HealthCare LLC"
+    assert data["landlord_name"] == "PH Office 2, LLC"
+    assert data["total_square_feet"] == "17090"
+    # The designator on the line after the premises address, not the earlier "Suite 20"
+    assert data["suite"] == "602"
+
+
+def test_extract_rejects_oversize_upload(monkeypatch):
+    monkeypatch.setattr("app.main.MAX_UPLOAD_BYTES", 16)
+    files = {"file": ("lease.pdf", io.BytesIO(make_pdf_bytes()), "application/pdf")}
+    response = client.post("/extract-lease-facts", files=files)
+    assert response.status_code == 413
+
+
+def test_extract_recovers_from_broken_worker_pool(monkeypatch):
+    import concurrent.futures
+    import os
+    import app.main as main
+
+    broken = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+    with pytest.raises(concurrent.futures.process.BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+    monkeypatch.setattr(main, "EXECUTOR", broken)
+
+    files = {"file": ("lease.pdf", io.BytesIO(main._WARMUP_PDF), "application/pdf")}
+    response = client.post("/extract-lease-facts", files=files)
+    assert response.status_code == 500
+    assert "worker process crashed" in response.text
+    assert main.EXECUTOR is not broken
+
+    files = {"file": ("lease.pdf", io.BytesIO(main._WARMUP_PDF), "application/pdf")}
+    response = client.post("/extract-lease-facts", files=files)
+    assert response.status_code == 200, response.text
+    main.EXECUTOR.shutdown()
+
+
+def test_extract_lease_facts_from_text():
+    text = (
+        "BASIC LEASE INFORMATION\n"
+        "Tenant: Acme Widgets LLC\n"
+        "Landlord: Subtenant Holdings LP\n"
+        "Premises Address: 100 Main Street, Suite 120B\n"
+        "Rentable Square Feet: 12,500\n"
+        "Commencement Date: January 5, 2024\n"
+        "Expiration Date: 01/31/2029\n"
+        "Proportionate Share: 12.5%\n"
+        "Base Year: 2024\n"
+        "Security Deposit: $25,000.00\n"
+    )
+    facts = _extract_lease_facts_from_text(text)
+    assert facts["tenant_name"] == "Acme Widgets LLC"
+    assert facts["landlord_name"] == "Subtenant Holdings LP"
+    assert facts["property_address"] == "100 Main Street"
+    assert facts["suite"] == "120B"
+    assert facts["property_address_and_suite"] == "100 Main Street Suite 120B"
+    assert facts["total_square_feet"] == "12500"
+    assert facts["lease_commencement_date"] == "05-01-2024"
+    assert facts["lease_expiration_date"] == "31-01-2029"
+    assert facts["proportionate_share"] == "12.5%"
+    assert facts["base_year"] == "2024"
+    assert facts["security_deposit"] == "25,000.00"
+
+
+def test_suite_closest_to_address_wins():
+    from app.main import _extract_address_and_suite
+
+    text = (
+        "Landlord Office, Suite 200\nPremises Address: 100 Main Street\n"
+        + "filler text without designators\n" * 1700
+        + "Payments per Exhibit #3\n"
+    )
+    assert _extract_address_and_suite(text) == ("100 Main Street", "200")
+
+    text = "Suite 9 is the landlord's office.\nPremises Address: 5 Elm Street\nSuite 410\n"
+    assert _extract_address_and_suite(text) == ("5 Elm Street", "410")
+
+
+def test_street_line_fallback_without_address_label():
+    from app.main import _extract_address_and_suite
+
+    assert _extract_address_and_suite("  1200 Oak Avenue\nSuite 300") == ("1200 Oak Avenue", "300")
+
+
+def test_street_line_fallback_only_scans_document_head():
+    from app.main import ADDRESS_SCAN_MAX_LINES, _extract_address_and_suite
+
+    head = "recital line\n" * (ADDRESS_SCAN_MAX_LINES - 1)
+    assert _extract_address_and_suite(head + "1200 Oak Avenue\n")[0] == "1200 Oak Avenue"
+    assert _extract_address_and_suite(head + "recital line\n1200 Oak Avenue\n") == (None, None)
+
+
+def test_street_line_match_never_spans_lines():
+    from app.main import _find_street_line, _normalize_for_matching
+
+    for text in ("12\nMain Street\n", "12 \nMain Street\n", "Lot 7 of\n12 the\nOak Avenue\n"):
+        assert _find_street_line(_normalize_for_matching(text)) is None
+    text = "Exhibit 4\n 12\n  350 Elm Road, Floor 2\nmore text"
+    span = _find_street_line(_normalize_for_matching(text))
+    assert span is not None
+    assert "\n" not in text[span[0]:span[1]]
+    assert text[span[0]:span[1]].strip() == "350 Elm Road, Floor 2"
+
+
+def test_extract_lease_facts_ignores_keywords_in_earlier_prose():
+    text = (
+        "The subtenant shall not object to the commencement of construction or any transfer "
+        + "of the Premises, " * 8
+        + "\nLandlord: Subtenant Holdings LP\n"
+        + "y" * 150
+        + "\nTenant: Acme Widgets International Holdings LLC\n"
+        + "Rentable Square Feet: 4,200\n"
+        + "Commencement Date: January 5, 2024\n"
+        + "Security Deposit: the parties agree that " + "w" * 250 + " none\n"
+    )
+    facts = _extract_lease_facts_from_text(text)
+    assert facts["tenant_name"] == "Acme Widgets International Holdings LLC"
+    assert facts["landlord_name"] == "Subtenant Holdings LP"
+    assert facts["total_square_feet"] == "4200"
+    assert facts["lease_commencement_date"] == "05-01-2024"
+    assert facts["security_deposit"] == "None"
+
+
+def test_label_windows_stay_bounded_without_newlines():
+    import app.main as main
+
+    text = "the tenant shall pay base rent to the landlord for the premises " * 40000
+    text_lc = main._normalize_for_matching(text)
+    offsets = main._find_label_offsets(text_lc)["tenant"]
+    window_lengths = []
+
+    class RecordingPattern:
+        def match(self, window, pos):
+            window_lengths.append(len(window))
+            return main._RE_TENANT.match(window, pos)
+
+    assert main._search_near(RecordingPattern(), text_lc, offsets) == (None, 0)
+    assert len(window_lengths) == len(offsets)
+    assert max(window_lengths) <= 1 + main.LABEL_WINDOW_CHARS + main.LABEL_LINE_TAIL_MAX_CHARS
+
+
+def test_patterns_agree_between_re_and_re2():
+    re2 = pytest.importorskip("re2")
+    import re
+    import app.main as main
+
+    names = [
+        "_RE_TENANT", "_RE_LANDLORD", "_RE_ADDRESS_LABEL", "_RE_SUITE", "_RE_STREET", "_RE_SQFT",
+        "_RE_COMMENCE", "_RE_EXPIRE", "_RE_PROP_SHARE", "_RE_BASE_YEAR", "_RE_SEC_DEPOSIT",
+        "_RE_SEC_DEPOSIT_NONE",
+    ]
+    samples = [
+        "Tenant:\xa0Acme Widgets LLC\nLandlord : Foo LP\n",
+        "Premises\u2002Address: 100 Main\xa0Street, Suite\xa0120B\n",
+        "  1200\u3000Oak Avenue\nRentable\xa0Square\xa0Feet:\xa012,500\n",
+        "Lease Commencement\xa0Date: January 5, 2024\nExpiry Date:\x0b01/31/2029\n",
+        "Proportionate\xa0Share: 12.5\u202f%\nBase\xa0Year: 2024\n",
+        "Security\xa0Deposit: $25,000.00\nSecurity Deposit\u2009shall be none\n",
+    ]
+    for name in names:
+        source = getattr(main, name).pattern
+        for sample in samples:
+            text = main._normalize_for_matching(sample)
+            stdlib_hit = re.compile(source).search(text)
+            re2_hit = re2.compile(source).search(text)
+            assert (stdlib_hit and stdlib_hit.span()) == (re2_hit and re2_hit.span()), (name, sample)
+
+    facts = _extract_lease_facts_from_text("Tenant:\xa0Acme\nBase\xa0Year:\xa02024\n")
+    assert facts["base_year"] == "2024"
+
+
+def test_call_openai_json_caches_by_prompt(monkeypatch):
+    import app.main as main
+
+    calls = []
+
+    class FakeCompletions:
+        def create(self, **kwargs):
+            calls.append(kwargs)
+            message = type("Message", (), {"content": '{"tenant_name": "Acme"}'})
+            choice = type("Choice", (), {"message": message})
+            return type("Response", (), {"choices": [choice]})
+
+    class FakeOpenAI:
+        def __init__(self):
+            self.chat = type("Chat", (), {"completions": FakeCompletions()})
+
+    monkeypatch.setattr(main, "_OPENAI_CLIENT", FakeOpenAI())
+    monkeypatch.setattr(main, "_LLM_CACHE", main.LRUCache(maxsize=4))
+
+    first = main._call_openai_json("Lease Text:\nTenant: Acme")
+    second = main._call_openai_json("Lease Text:\nTenant: Acme")
+    assert first == second
+    assert first["tenant_name"] == "Acme"
+    assert len(calls) == 1
+
+
+def test_build_llm_context_uses_windows_around_missing_labels():
+    import app.main as main
+
+    text = ("x" * 20000) + "\nBase Year: see Exhibit C\n" + ("y" * 20000)
+    label_offsets = main._find_label_offsets(main._normalize_for_matching(text))
+    context = main._build_llm_context(text, ["base_year"], label_offsets)
+    assert "Base Year: see Exhibit C" in context
+    assert len(context) <= main.LLM_CONTEXT_MAX_CHARS
+    assert len(context) < len(text[:12000])
+
+
+def test_needs_llm():
+    import app.main as main
+
+    assert not main._needs_llm([])
+    assert not main._needs_llm(["base_year"])
+    assert main._needs_llm(["tenant_name"])
+    assert main._needs_llm(["base_year", "security_deposit"])